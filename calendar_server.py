@@ -3,48 +3,369 @@
 # that will handle requests from ElevenLabs and interact with Google Calendar.
 
 import os
+import re
 import json
-from flask import Flask, request, jsonify, redirect, Response
-from google.auth.transport.requests import Request
+import time
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timezone
+from email.parser import BytesParser
+import msgspec
+import orjson
+import requests
+from cachetools import TTLCache
+from flask import Flask, request, jsonify, Response
+from flask.json.provider import JSONProvider
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from urllib.parse import urlparse, urlunparse
+from requests.adapters import HTTPAdapter
 
 # Define the scopes required to interact with Google Calendar.
 # 'calendar.events' allows the app to manage (create, update, delete) events.
 SCOPES = ['https://www.googleapis.com/auth/calendar.events']
-AUTH_TOKEN_FILE = "token.json"
+# Calendar API endpoints for inserting events. Only events.insert is used, so the
+# API is called directly rather than through a discovery-built client.
+CALENDAR_EVENTS_PATH = '/calendar/v3/calendars/{calendar_id}/events'
+CALENDAR_EVENTS_URL = 'https://www.googleapis.com' + CALENDAR_EVENTS_PATH
+CALENDAR_BATCH_URL = 'https://www.googleapis.com/batch/calendar/v3'
+# The Calendar API accepts at most 50 requests in a single batch.
+CALENDAR_BATCH_LIMIT = 50
+# Google answers a batch only once every insert in it has finished, so a batch
+# request is allowed this many extra seconds per event on top of GOOGLE_API_TIMEOUT.
+CALENDAR_BATCH_TIMEOUT_PER_EVENT = 1
+# Timezone applied to the start and end of every event. Set to your desired timezone.
+EVENT_TIME_ZONE = 'America/New_York'
+# Upper bound, in seconds, on how long a worker may block on a Google API call.
+GOOGLE_API_TIMEOUT = 10
+# Seconds before the access token expires at which it is proactively refreshed.
+# google-auth already treats credentials as invalid 3m45s before expiry, and
+# AuthorizedSession then refreshes inline on every request without our lock,
+# so this must stay larger than that threshold.
+TOKEN_REFRESH_MARGIN = 5 * 60
+# Pooled connections to Google kept per process. Sized from WEB_THREADS, the
+# same setting render.yaml passes to gunicorn --threads, so each thread has one.
+HTTP_POOL_SIZE = int(os.environ.get('WEB_THREADS', 32))
+# How long, in seconds, a scheduled appointment is remembered so that a retried
+# request with the same details returns the original event instead of a duplicate.
+IDEMPOTENCY_TTL = 60
+
+class OrjsonProvider(JSONProvider):
+    """
+    JSON provider that uses orjson instead of the standard library json module,
+    so jsonify() and request parsing avoid the slower stdlib encoder/decoder.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Serialize straight to bytes rather than going through dumps() and re-encoding.
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
+class Appointment(msgspec.Struct):
+    """
+    The JSON payload accepted by /schedule-appointment.
+    """
+    start_time: str
+    end_time: str
+    summary: str = 'New AI Agent Consultation'
+
+class AppointmentBatch(msgspec.Struct):
+    """
+    The JSON payload accepted by /schedule-appointments.
+    """
+    appointments: list[Appointment]
+
+# Parse and validate a request body in a single pass.
+_APPOINTMENT_DECODER = msgspec.json.Decoder(Appointment)
+_APPOINTMENT_BATCH_DECODER = msgspec.json.Decoder(AppointmentBatch)
+
+def _load_env_json(name):
+    """
+    Parses a JSON blob stored in an environment variable, or returns None if it is unset.
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return None
+    return json.loads(value)
+
+# The OAuth client config and token are parsed once at startup instead of on
+# every request. A malformed value fails loudly at boot rather than per call.
+_CREDS_INFO = _load_env_json('GOOGLE_CALENDAR_CREDENTIALS')
+_TOKEN_INFO = _load_env_json('GOOGLE_CALENDAR_TOKEN')
+
+# Everything in the event body except the summary, start and end is the same
+# for every appointment, so the body is serialized once at startup and split
+# around placeholders. Each request only encodes its three values.
+_EVENT_PLACEHOLDER = '__EVENT_VALUE__'
+_EVENT_SEGMENTS = orjson.dumps({
+    'summary': _EVENT_PLACEHOLDER,
+    'location': 'Client Call',
+    'description': 'Scheduled by AdiuvansAI Agent.',
+    'start': {'dateTime': _EVENT_PLACEHOLDER, 'timeZone': EVENT_TIME_ZONE},
+    'end': {'dateTime': _EVENT_PLACEHOLDER, 'timeZone': EVENT_TIME_ZONE},
+    'reminders': {
+        'useDefault': False,
+        'overrides': [
+            {'method': 'email', 'minutes': 24 * 60},
+            {'method': 'popup', 'minutes': 10},
+        ],
+    },
+}).split(orjson.dumps(_EVENT_PLACEHOLDER))
+
+def _event_body(summary, start_time, end_time):
+    """
+    Returns the JSON-encoded event body for the Google Calendar API.
+    """
+    head, after_summary, after_start, tail = _EVENT_SEGMENTS
+    return b''.join((
+        head, orjson.dumps(summary),
+        after_summary, orjson.dumps(start_time),
+        after_start, orjson.dumps(end_time),
+        tail,
+    ))
+
+# Error bodies that never vary are serialized once rather than on every failure.
+_ERROR_NO_PAYLOAD = orjson.dumps({"error": "No JSON payload received."})
+_ERROR_INVALID_JSON = orjson.dumps({"error": "Invalid JSON payload."})
+_ERROR_NO_APPOINTMENTS = orjson.dumps({"error": "No appointments received."})
+_ERROR_MISSING_TIMES = orjson.dumps({"error": "Missing start_time or end_time."})
+_IN_FLIGHT_MESSAGE = "This appointment is still being scheduled by an earlier request; please retry shortly."
+_ERROR_IN_FLIGHT = orjson.dumps({"error": _IN_FLIGHT_MESSAGE})
+_ERROR_NO_MCP_TOOLS = orjson.dumps({"error": "mcp_server_tools.json not found."})
+_ERROR_INVALID_MCP_TOOLS = orjson.dumps({"error": "mcp_server_tools.json is not valid JSON."})
+
+def _json_error(body, status):
+    """
+    Wraps a pre-serialized JSON error body in a response with the given status.
+    """
+    return Response(body, status=status, mimetype='application/json')
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# The credentials and the authorized HTTP session are built once and shared
+# across requests. The session pools keep-alive connections to Google, so
+# inserts avoid a new TCP+TLS handshake per request.
+_creds = None
+_session = None
+_session_lock = threading.Lock()
+# time.monotonic() deadline until which the cached session can be used without
+# checking the credentials. Requests before it never touch the lock; after it,
+# one thread refreshes the token while the others wait and re-check.
+_creds_good_until = 0.0
+# Recently scheduled appointments, keyed by a digest of their details. Guards
+# against duplicate events when ElevenLabs retries a request that timed out.
+_recent_appointments = TTLCache(maxsize=1024, ttl=IDEMPOTENCY_TTL)
+_recent_appointments_lock = threading.Lock()
+# Appointments currently being scheduled, keyed the same way. A retry that
+# arrives while the original is still waiting on Google blocks on its event
+# and then reuses its result.
+_in_flight_appointments = {}
 
-# Function to get Google Calendar service.
-def get_calendar_service():
+def _load_credentials():
     """
-    Retrieves the Google Calendar service object using credentials and token
-    from environment variables for secure, production-ready authentication.
+    Builds a credentials object from the token stored in environment variables.
+    Only called once per process; afterwards the in-memory credentials are refreshed.
     """
-    creds = None
+    if _CREDS_INFO is None or _TOKEN_INFO is None:
+        raise RuntimeError(
+            "Failed to load credentials or token from environment variables: "
+            "GOOGLE_CALENDAR_CREDENTIALS and GOOGLE_CALENDAR_TOKEN must both be set."
+        )
     try:
-        # Load the credentials from the GOOGLE_CALENDAR_CREDENTIALS env variable
-        creds_info = json.loads(os.environ.get('GOOGLE_CALENDAR_CREDENTIALS'))
-        # Load the token from the GOOGLE_CALENDAR_TOKEN env variable
-        token_info = json.loads(os.environ.get('GOOGLE_CALENDAR_TOKEN'))
-        
         # Build a credentials object from the loaded token info.
-        creds = Credentials.from_authorized_user_info(info=token_info, scopes=SCOPES)
-        
-        # If the token has expired, refresh it.
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-    except (json.JSONDecodeError, TypeError) as e:
-        return jsonify({"error": f"Failed to load credentials or token from environment variables: {e}"}), 500
+        return Credentials.from_authorized_user_info(info=_TOKEN_INFO, scopes=SCOPES)
     except Exception as e:
-        return jsonify({"error": f"Authentication failed: {e}"}), 500
-    
-    service = build('calendar', 'v3', credentials=creds)
-    return service
+        raise RuntimeError(f"Authentication failed: {e}")
+
+def _usable_until(creds):
+    """
+    Returns the time.monotonic() deadline at which the credentials should next be
+    refreshed: TOKEN_REFRESH_MARGIN seconds before their token expires.
+    """
+    if creds.expiry is None:
+        return float('inf')
+    # google-auth stores expiry as a naive UTC datetime.
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return time.monotonic() + (creds.expiry - now).total_seconds() - TOKEN_REFRESH_MARGIN
+
+# Function to get an authorized Google Calendar session.
+def get_calendar_session():
+    """
+    Retrieves an authorized HTTP session for the Google Calendar API using
+    credentials and token from environment variables for secure,
+    production-ready authentication. The credentials and session are cached;
+    the token is refreshed in place shortly before it expires.
+    """
+    global _creds, _session, _creds_good_until
+    if time.monotonic() < _creds_good_until:
+        return _session
+
+    with _session_lock:
+        # Another request may have refreshed the token while we were waiting.
+        if time.monotonic() < _creds_good_until:
+            return _session
+
+        if _creds is None:
+            _creds = _load_credentials()
+
+        # Refresh the token if it has expired or is about to.
+        needs_refresh = not _creds.valid or _usable_until(_creds) <= time.monotonic()
+        if needs_refresh and _creds.refresh_token:
+            try:
+                _creds.refresh(Request())
+            except Exception as e:
+                raise RuntimeError(f"Authentication failed: {e}")
+
+        if _session is None:
+            # The session holds a reference to _creds, so later in-place
+            # refreshes are picked up without rebuilding it.
+            session = AuthorizedSession(_creds)
+            session.mount('https://', HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE))
+            _session = session
+
+        # Only open the lock-free path once the session is in place and the
+        # credentials are usable; otherwise the next request tries again.
+        if _creds.valid:
+            _creds_good_until = _usable_until(_creds)
+        return _session
+
+def _idempotency_key(summary, start_time, end_time):
+    """
+    Returns a digest identifying an appointment by its details.
+    """
+    return hashlib.blake2b(
+        orjson.dumps((summary, start_time, end_time)), digest_size=16
+    ).digest()
+
+def _scheduled_result(event):
+    """
+    Returns the success response body for an event created by the Calendar API.
+    """
+    return {
+        "status": "success",
+        "message": "Appointment scheduled successfully.",
+        "event_link": event.get('htmlLink')
+    }
+
+def _claim_appointment(key):
+    """
+    Looks up an appointment by idempotency key; call with _recent_appointments_lock held.
+    Returns (result, None) if it was scheduled recently, (None, event) if another
+    request is scheduling it now, or (None, None) after marking it in flight for
+    the caller, who must then call _release_appointment().
+    """
+    cached = _recent_appointments.get(key)
+    if cached is not None:
+        return cached, None
+    in_flight = _in_flight_appointments.get(key)
+    if in_flight is not None:
+        return None, in_flight
+    _in_flight_appointments[key] = threading.Event()
+    return None, None
+
+def _release_appointment(key, result):
+    """
+    Ends an in-flight appointment, caching its result unless it failed (None),
+    and wakes any requests waiting on it.
+    """
+    with _recent_appointments_lock:
+        if result is not None:
+            _recent_appointments[key] = result
+        _in_flight_appointments.pop(key).set()
+
+# Matches the Content-ID Google gives each batch response part, e.g. <response-item3>.
+_BATCH_CONTENT_ID = re.compile(r'item(\d+)>?\s*$')
+# Reported for an event whose part of the batch response is missing or unreadable.
+_BATCH_PART_MISSING = b'No readable response in batch; the appointment may or may not have been scheduled.'
+# Reported for every event in a batch request that timed out.
+_BATCH_TIMED_OUT = b'Batch request timed out; the appointment may or may not have been scheduled.'
+
+def _insert_events_batch(session, calendar_id, bodies):
+    """
+    Inserts several events with a single request to the Calendar batch endpoint.
+    Returns a (status code, response body) pair per event, in the order given;
+    an event whose response is missing or unreadable is reported as a 502, and
+    every event is reported as a 504 if the batch request times out.
+    """
+    boundary = uuid.uuid4().hex
+    path = CALENDAR_EVENTS_PATH.format(calendar_id=calendar_id)
+    parts = []
+    for index, body in enumerate(bodies):
+        parts.append((
+            f'--{boundary}\r\n'
+            'Content-Type: application/http\r\n'
+            f'Content-ID: <item{index}>\r\n\r\n'
+            f'POST {path} HTTP/1.1\r\n'
+            'Content-Type: application/json\r\n\r\n'
+        ).encode())
+        parts.append(body)
+        parts.append(b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+
+    try:
+        response = session.post(
+            CALENDAR_BATCH_URL,
+            data=b''.join(parts),
+            headers={'Content-Type': f'multipart/mixed; boundary={boundary}'},
+            timeout=GOOGLE_API_TIMEOUT + CALENDAR_BATCH_TIMEOUT_PER_EVENT * len(bodies),
+        )
+    except requests.Timeout:
+        # Google may still create these events, but only this batch's results
+        # are lost; other batches in the same request keep theirs.
+        return [(504, _BATCH_TIMED_OUT)] * len(bodies)
+    if not response.ok:
+        raise RuntimeError(f"Google Calendar API Error: {response.text}")
+
+    # Each part of the multipart response wraps one HTTP response, tagged with
+    # the Content-ID of its request; parts are not guaranteed to be in order.
+    # Google has already acted on the batch by now, so a part that cannot be
+    # read only marks its own event as unknown rather than failing the rest.
+    results = [(502, _BATCH_PART_MISSING)] * len(bodies)
+    content_type = response.headers.get('Content-Type', '')
+    if not content_type.startswith('multipart/'):
+        return results
+    header = f"Content-Type: {content_type}\r\n\r\n".encode()
+    message = BytesParser().parsebytes(header + response.content)
+    if not message.is_multipart():
+        return results
+    for part in message.get_payload():
+        match = _BATCH_CONTENT_ID.search(part['Content-ID'] or '')
+        payload = part.get_payload(decode=True)
+        if match is None or not isinstance(payload, bytes):
+            continue
+        index = int(match.group(1))
+        status_line, _, rest = payload.partition(b'\n')
+        status = status_line.split()
+        if index >= len(bodies) or len(status) < 2 or not status[1].isdigit():
+            continue
+        content = re.split(rb'\r?\n\r?\n', rest, maxsplit=1)[-1]
+        results[index] = (int(status[1]), content)
+    return results
+
+def _load_mcp_tools():
+    """
+    Reads and re-serializes the tools manifest. Returns the response body and
+    status to serve it with: an error body if the file is missing or invalid,
+    so a bad manifest only breaks its own endpoint rather than server startup.
+    """
+    try:
+        with open('mcp_server_tools.json', 'rb') as f:
+            return orjson.dumps(orjson.loads(f.read())), 200
+    except FileNotFoundError:
+        return _ERROR_NO_MCP_TOOLS, 404
+    except orjson.JSONDecodeError:
+        return _ERROR_INVALID_MCP_TOOLS, 500
+
+# The manifest does not change while the server runs, so it is read once at
+# startup rather than opened and parsed on every request.
+_MCP_TOOLS_JSON, _MCP_TOOLS_STATUS = _load_mcp_tools()
 
 # New endpoint to serve the tools manifest.
 @app.route('/mcp_server_tools.json')
@@ -52,12 +373,7 @@ def serve_mcp_tools():
     """
     Serves the mcp_server_tools.json file, which tells ElevenLabs what tools are available.
     """
-    try:
-        with open('mcp_server_tools.json', 'r') as f:
-            data = json.load(f)
-        return jsonify(data)
-    except FileNotFoundError:
-        return jsonify({"error": "mcp_server_tools.json not found."}), 404
+    return Response(_MCP_TOOLS_JSON, status=_MCP_TOOLS_STATUS, mimetype='application/json')
 
 # Main endpoint to handle scheduling requests from ElevenLabs.
 @app.route('/schedule-appointment', methods=['POST'])
@@ -68,59 +384,187 @@ def schedule_appointment():
     """
     try:
         # Parse the JSON payload from the request.
-        data = request.json
-        if not data:
-            return jsonify({"error": "No JSON payload received."}), 400
-        
-        summary = data.get('summary', 'New AI Agent Consultation')
-        start_time = data.get('start_time')
-        end_time = data.get('end_time')
+        body = request.get_data()
+        if not body:
+            return _json_error(_ERROR_NO_PAYLOAD, 400)
+        try:
+            appointment = _APPOINTMENT_DECODER.decode(body)
+        except msgspec.ValidationError as e:
+            return jsonify({"error": f"Invalid appointment details: {e}"}), 400
+        except msgspec.DecodeError:
+            return _json_error(_ERROR_INVALID_JSON, 400)
+
+        summary = appointment.summary
+        start_time = appointment.start_time
+        end_time = appointment.end_time
         calendar_id = 'primary' # You can make this configurable if needed.
 
-        # Basic validation of the incoming data.
+        # The decoder rejects missing fields; also reject empty ones.
         if not start_time or not end_time:
-            return jsonify({"error": "Missing start_time or end_time."}), 400
-
-        service = get_calendar_service()
-
-        # Build the event body for the Google Calendar API.
-        event = {
-            'summary': summary,
-            'location': 'Client Call',
-            'description': 'Scheduled by AdiuvansAI Agent.',
-            'start': {
-                'dateTime': start_time,
-                'timeZone': 'America/New_York', # Set to your desired timezone.
-            },
-            'end': {
-                'dateTime': end_time,
-                'timeZone': 'America/New_York',
-            },
-            'reminders': {
-                'useDefault': False,
-                'overrides': [
-                    {'method': 'email', 'minutes': 24 * 60},
-                    {'method': 'popup', 'minutes': 10},
-                ],
-            },
-        }
-
-        # Call the Google Calendar API to insert the event.
-        event = service.events().insert(calendarId=calendar_id, body=event).execute()
-        
-        # Return a success message with details of the created event.
+            return _json_error(_ERROR_MISSING_TIMES, 400)
+
+        # A retry of an appointment scheduled moments ago gets the original
+        # result. If the original is still in flight, wait for it to finish; if
+        # it failed, this request takes over and schedules the appointment.
+        # The wait is bounded so a stalled original cannot pin this thread too.
+        idempotency_key = _idempotency_key(summary, start_time, end_time)
+        while True:
+            with _recent_appointments_lock:
+                cached, in_flight = _claim_appointment(idempotency_key)
+            if in_flight is None:
+                break
+            if not in_flight.wait(GOOGLE_API_TIMEOUT):
+                return _json_error(_ERROR_IN_FLIGHT, 409)
+        if cached is not None:
+            return jsonify(cached), 200
+
+        result = None
+        try:
+            session = get_calendar_session()
+
+            # Call the Google Calendar API to insert the event.
+            response = session.post(
+                CALENDAR_EVENTS_URL.format(calendar_id=calendar_id),
+                data=_event_body(summary, start_time, end_time),
+                headers={'Content-Type': 'application/json'},
+                timeout=GOOGLE_API_TIMEOUT,
+            )
+            if not response.ok:
+                return jsonify({"error": f"Google Calendar API Error: {response.text}"}), 500
+            # The event exists even if its body is unreadable.
+            try:
+                event = orjson.loads(response.content)
+            except orjson.JSONDecodeError:
+                event = {}
+
+            # Return a success message with details of the created event.
+            result = _scheduled_result(event)
+            return jsonify(result), 200
+        finally:
+            _release_appointment(idempotency_key, result)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Endpoint to schedule a burst of appointments in as few API calls as possible.
+@app.route('/schedule-appointments', methods=['POST'])
+def schedule_appointments():
+    """
+    An API endpoint that takes a list of appointments and creates them in the
+    user's Google Calendar, sending up to CALENDAR_BATCH_LIMIT inserts per
+    batch request. Returns one result per appointment, in the order given.
+    """
+    try:
+        # Parse the JSON payload from the request.
+        body = request.get_data()
+        if not body:
+            return _json_error(_ERROR_NO_PAYLOAD, 400)
+        try:
+            appointments = _APPOINTMENT_BATCH_DECODER.decode(body).appointments
+        except msgspec.ValidationError as e:
+            return jsonify({"error": f"Invalid appointment details: {e}"}), 400
+        except msgspec.DecodeError:
+            return _json_error(_ERROR_INVALID_JSON, 400)
+
+        if not appointments:
+            return _json_error(_ERROR_NO_APPOINTMENTS, 400)
+        for appointment in appointments:
+            if not appointment.start_time or not appointment.end_time:
+                return _json_error(_ERROR_MISSING_TIMES, 400)
+        calendar_id = 'primary' # You can make this configurable if needed.
+
+        # Identical appointments in one request are scheduled once. Those
+        # scheduled moments ago are answered from the cache and those another
+        # request is scheduling right now are waited on; only the rest are
+        # claimed by this request and sent to Google.
+        keys = [
+            _idempotency_key(a.summary, a.start_time, a.end_time) for a in appointments
+        ]
+        results_by_key = {}
+        claimed = {}
+        waiting = {}
+        with _recent_appointments_lock:
+            for key, appointment in zip(keys, appointments):
+                if key in results_by_key or key in claimed or key in waiting:
+                    continue
+                cached, in_flight = _claim_appointment(key)
+                if cached is not None:
+                    results_by_key[key] = cached
+                elif in_flight is not None:
+                    waiting[key] = in_flight
+                else:
+                    claimed[key] = appointment
+
+        try:
+            if claimed:
+                session = get_calendar_session()
+                pending = list(claimed)
+                for offset in range(0, len(pending), CALENDAR_BATCH_LIMIT):
+                    chunk = pending[offset:offset + CALENDAR_BATCH_LIMIT]
+                    responses = _insert_events_batch(session, calendar_id, [
+                        _event_body(
+                            claimed[key].summary,
+                            claimed[key].start_time,
+                            claimed[key].end_time,
+                        )
+                        for key in chunk
+                    ])
+                    for key, (status, content) in zip(chunk, responses):
+                        if 200 <= status < 300:
+                            # The event exists even if its body is unreadable.
+                            try:
+                                event = orjson.loads(content)
+                            except orjson.JSONDecodeError:
+                                event = {}
+                            results_by_key[key] = _scheduled_result(event)
+                        else:
+                            results_by_key[key] = {
+                                "status": "error",
+                                "error": f"Google Calendar API Error: {content.decode(errors='replace')}"
+                            }
+        finally:
+            for key in claimed:
+                result = results_by_key.get(key)
+                if result is not None and result["status"] != "success":
+                    result = None
+                _release_appointment(key, result)
+
+        # Only wait once this request's own claims are released, so two batches
+        # holding each other's appointments cannot deadlock. All waits share
+        # one bounded deadline so a stalled request cannot pin this thread.
+        wait_until = time.monotonic() + GOOGLE_API_TIMEOUT
+        for key, in_flight in waiting.items():
+            if not in_flight.wait(max(0, wait_until - time.monotonic())):
+                results_by_key[key] = {"status": "error", "error": _IN_FLIGHT_MESSAGE}
+                continue
+            with _recent_appointments_lock:
+                cached = _recent_appointments.get(key)
+            results_by_key[key] = cached or {
+                "status": "error",
+                "error": "A concurrent request for this appointment failed; please retry."
+            }
+
+        results = [results_by_key[key] for key in keys]
+        scheduled = sum(result["status"] == "success" for result in results)
+        if scheduled == len(results):
+            status, status_code = "success", 200
+        elif scheduled:
+            status, status_code = "partial", 200
+        else:
+            status, status_code = "error", 500
         return jsonify({
-            "status": "success",
-            "message": "Appointment scheduled successfully.",
-            "event_link": event.get('htmlLink')
-        }), 200
+            "status": status,
+            "message": f"{scheduled} of {len(results)} appointments scheduled.",
+            "results": results
+        }), status_code
 
-    except HttpError as e:
-        return jsonify({"error": f"Google Calendar API Error: {e.content.decode()}"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
     # When running on Render, the port is provided as an environment variable.
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    # The debugger and reloader add per-request overhead, so they are opt-in
+    # for local development only.
+    debug = os.environ.get('FLASK_DEBUG') == '1'
+    app.run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,408 @@
+# test_calendar_server.py
+# Tests for calendar_server.py. Google is never contacted: the authorized
+# session is replaced with a fake that records the requests made to it.
+
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+import orjson
+import pytest
+import requests
+from google.oauth2.credentials import Credentials
+
+import calendar_server
+
+APPOINTMENT = {
+    "summary": "Intro call",
+    "start_time": "2026-10-15T10:00:00",
+    "end_time": "2026-10-15T10:30:00",
+}
+
+class FakeResponse:
+    def __init__(self, status_code, content, content_type='application/json'):
+        self.status_code = status_code
+        self.ok = 200 <= status_code < 400
+        self.content = content
+        self.text = content.decode()
+        self.headers = {'Content-Type': content_type}
+
+class FakeSession:
+    """
+    Stands in for the AuthorizedSession, answering every POST with a created event.
+    Set `release` to an unset threading.Event to hold requests until it is set,
+    or `failures` to fail that many requests first.
+    """
+
+    def __init__(self):
+        self.posts = []
+        self.release = None
+        self.failures = 0
+        self.started = threading.Event()
+
+    def post(self, url, data, headers, timeout):
+        if self.failures:
+            self.failures -= 1
+            return FakeResponse(500, b'{"error": "backend error"}')
+        self.posts.append((url, data))
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        return FakeResponse(200, orjson.dumps({"htmlLink": f"https://calendar/{len(self.posts)}"}))
+
+@pytest.fixture(autouse=True)
+def clear_appointment_cache():
+    calendar_server._recent_appointments.clear()
+    calendar_server._in_flight_appointments.clear()
+    yield
+    calendar_server._recent_appointments.clear()
+    calendar_server._in_flight_appointments.clear()
+
+@pytest.fixture
+def session(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(calendar_server, 'get_calendar_session', lambda: fake)
+    return fake
+
+@pytest.fixture
+def client():
+    return calendar_server.app.test_client()
+
+def test_retry_returns_cached_result(client, session):
+    first = client.post('/schedule-appointment', data=orjson.dumps(APPOINTMENT))
+    second = client.post('/schedule-appointment', data=orjson.dumps(APPOINTMENT))
+
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == second.get_json()
+    assert len(session.posts) == 1
+
+def test_retry_waits_for_in_flight_request(session):
+    # The retry arrives while the original is still waiting on Google.
+    session.release = threading.Event()
+    responses = []
+
+    def post():
+        with calendar_server.app.test_client() as client:
+            responses.append(client.post('/schedule-appointment', data=orjson.dumps(APPOINTMENT)))
+
+    original = threading.Thread(target=post)
+    original.start()
+    assert session.started.wait(5)
+    retry = threading.Thread(target=post)
+    retry.start()
+    retry.join(0.2)
+    assert retry.is_alive()
+
+    session.release.set()
+    original.join(5)
+    retry.join(5)
+
+    assert len(session.posts) == 1
+    assert [r.status_code for r in responses] == [200, 200]
+    assert responses[0].get_json() == responses[1].get_json()
+    assert not calendar_server._in_flight_appointments
+
+def stall_in_flight(appointment):
+    # Marks the appointment as being scheduled by a request that never finishes.
+    key = calendar_server._idempotency_key(
+        appointment["summary"], appointment["start_time"], appointment["end_time"]
+    )
+    calendar_server._in_flight_appointments[key] = threading.Event()
+
+def test_retry_gives_up_waiting_on_stalled_request(client, session, monkeypatch):
+    monkeypatch.setattr(calendar_server, 'GOOGLE_API_TIMEOUT', 0.1)
+    stall_in_flight(APPOINTMENT)
+
+    response = client.post('/schedule-appointment', data=orjson.dumps(APPOINTMENT))
+
+    assert response.status_code == 409
+    assert response.get_json() == {"error": calendar_server._IN_FLIGHT_MESSAGE}
+    assert not session.posts
+
+def test_failed_request_is_not_cached(client, session):
+    session.failures = 1
+    failed = client.post('/schedule-appointment', data=orjson.dumps(APPOINTMENT))
+    assert failed.status_code == 500
+    assert not calendar_server._in_flight_appointments
+
+    retried = client.post('/schedule-appointment', data=orjson.dumps(APPOINTMENT))
+    assert retried.status_code == 200
+    assert len(session.posts) == 1
+
+def test_unreadable_success_body_is_still_cached(client, session, monkeypatch):
+    def post(url, data, headers, timeout):
+        session.posts.append((url, data))
+        return FakeResponse(200, b'<html>not json</html>')
+    monkeypatch.setattr(session, 'post', post)
+
+    first = client.post('/schedule-appointment', data=orjson.dumps(APPOINTMENT))
+    retried = client.post('/schedule-appointment', data=orjson.dumps(APPOINTMENT))
+
+    assert first.status_code == retried.status_code == 200
+    assert first.get_json()["event_link"] is None
+    assert len(session.posts) == 1
+
+def batch_part(content_id, status_line, body):
+    part = 'Content-Type: application/http\r\n'
+    if content_id is not None:
+        part += f'Content-ID: {content_id}\r\n'
+    part += f'\r\n{status_line}\r\nContent-Type: application/json\r\n\r\n'
+    return part.encode() + body + b'\r\n'
+
+def batch_response(*parts):
+    body = b''.join(b'--batch_resp\r\n' + part for part in parts) + b'--batch_resp--\r\n'
+    return FakeResponse(200, body, 'multipart/mixed; boundary=batch_resp')
+
+def insert_batch_with_response(response, count):
+    session = FakeSession()
+    session.post = lambda *args, **kwargs: response
+    bodies = [orjson.dumps({"summary": str(index)}) for index in range(count)]
+    return calendar_server._insert_events_batch(session, 'primary', bodies)
+
+def test_batch_parts_are_matched_by_content_id():
+    results = insert_batch_with_response(batch_response(
+        batch_part('<response-item1>', 'HTTP/1.1 200 OK', '{"htmlLink": "bé"}'.encode()),
+        batch_part('<response-item0>', 'HTTP/1.1 400 Bad Request', b'{"error": "bad"}'),
+    ), 2)
+
+    assert results == [(400, b'{"error": "bad"}'), (200, '{"htmlLink": "bé"}'.encode())]
+
+def test_malformed_batch_parts_only_affect_their_event():
+    results = insert_batch_with_response(batch_response(
+        batch_part(None, 'HTTP/1.1 200 OK', b'{}'),
+        batch_part('<response-item>', 'HTTP/1.1 200 OK', b'{}'),
+        batch_part('<response-item7>', 'HTTP/1.1 200 OK', b'{}'),
+        batch_part('<response-item1>', 'garbage', b'{}'),
+        batch_part('<response-item2>', 'HTTP/1.1 200 OK', b'{"htmlLink": "c"}'),
+    ), 3)
+
+    missing = (502, calendar_server._BATCH_PART_MISSING)
+    assert results == [missing, missing, (200, b'{"htmlLink": "c"}')]
+
+def test_non_multipart_batch_response_marks_every_event_unknown():
+    results = insert_batch_with_response(FakeResponse(200, b'{"kind": "unexpected"}'), 2)
+
+    assert results == [(502, calendar_server._BATCH_PART_MISSING)] * 2
+
+class FakeBatchSession(FakeSession):
+    """
+    Answers batch requests with one part per inner request, each with `status_line`.
+    """
+
+    def __init__(self, status_line='HTTP/1.1 200 OK'):
+        super().__init__()
+        self.status_line = status_line
+
+    def post(self, url, data, headers, timeout):
+        self.posts.append((url, data))
+        boundary = headers['Content-Type'].split('boundary=')[1].encode()
+        content_ids = [
+            line.split(b'<')[1].split(b'>')[0].decode()
+            for line in data.split(b'\r\n') if line.startswith(b'Content-ID:')
+        ]
+        return batch_response(*(
+            batch_part(f'<response-{content_id}>', self.status_line,
+                       orjson.dumps({"htmlLink": f"https://calendar/{content_id}"}))
+            for content_id in content_ids
+        ))
+
+def post_batch(client, appointments):
+    return client.post('/schedule-appointments', data=orjson.dumps({"appointments": appointments}))
+
+def test_identical_appointments_in_a_batch_are_scheduled_once(client, monkeypatch):
+    session = FakeBatchSession()
+    monkeypatch.setattr(calendar_server, 'get_calendar_session', lambda: session)
+    other = dict(APPOINTMENT, summary="Follow-up")
+
+    response = post_batch(client, [APPOINTMENT, other, APPOINTMENT])
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["status"] == "success"
+    assert body["results"][0] == body["results"][2]
+    assert body["results"][0] != body["results"][1]
+    assert session.posts[0][1].count(b'Content-ID:') == 2
+    assert not calendar_server._in_flight_appointments
+
+def test_batch_reuses_single_appointment_result(client, session, monkeypatch):
+    single = client.post('/schedule-appointment', data=orjson.dumps(APPOINTMENT)).get_json()
+    batch_session = FakeBatchSession()
+    monkeypatch.setattr(calendar_server, 'get_calendar_session', lambda: batch_session)
+
+    body = post_batch(client, [APPOINTMENT]).get_json()
+
+    assert body["results"] == [single]
+    assert not batch_session.posts
+
+def test_batch_reports_error_when_nothing_was_scheduled(client, monkeypatch):
+    session = FakeBatchSession('HTTP/1.1 403 Forbidden')
+    monkeypatch.setattr(calendar_server, 'get_calendar_session', lambda: session)
+
+    response = post_batch(client, [APPOINTMENT, dict(APPOINTMENT, summary="Follow-up")])
+
+    body = response.get_json()
+    assert response.status_code == 500
+    assert body["status"] == "error"
+    assert all(result["status"] == "error" for result in body["results"])
+    assert not calendar_server._recent_appointments
+    assert not calendar_server._in_flight_appointments
+
+class FakeCredentials(Credentials):
+    """
+    Real google-auth credentials, so `valid` follows the library's own expiry
+    rules, whose refresh() extends the expiry by an hour instead of calling Google.
+    """
+
+    def __init__(self, expires_in):
+        super().__init__(token='token', refresh_token='refresh-token', expiry=utcnow() + expires_in)
+        self.refreshes = 0
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.token = f'token-{self.refreshes}'
+        self.expiry = utcnow() + timedelta(hours=1)
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+@pytest.fixture
+def fresh_session_cache(monkeypatch):
+    monkeypatch.setattr(calendar_server, '_creds', None)
+    monkeypatch.setattr(calendar_server, '_session', None)
+    monkeypatch.setattr(calendar_server, '_creds_good_until', 0.0)
+
+def use_credentials(monkeypatch, creds):
+    monkeypatch.setattr(calendar_server, '_load_credentials', lambda: creds)
+    return creds
+
+def test_token_inside_google_auth_refresh_window_is_refreshed_under_lock(fresh_session_cache, monkeypatch):
+    creds = use_credentials(monkeypatch, FakeCredentials(timedelta(minutes=10)))
+    session = calendar_server.get_calendar_session()
+    assert creds.refreshes == 0
+
+    # Seven minutes later the token expires in three: past TOKEN_REFRESH_MARGIN
+    # but inside google-auth's refresh threshold, so it is already invalid and
+    # the session would refresh it inline, outside the lock.
+    later = time.monotonic() + 7 * 60
+    monkeypatch.setattr(time, 'monotonic', lambda: later)
+    creds.expiry -= timedelta(minutes=7)
+    assert not creds.valid
+
+    assert calendar_server.get_calendar_session() is session
+    assert creds.refreshes == 1
+    assert creds.valid
+
+def test_lock_free_deadline_ends_before_google_auth_invalidates_token(fresh_session_cache, monkeypatch):
+    expires_in = timedelta(minutes=10)
+    creds = use_credentials(monkeypatch, FakeCredentials(expires_in))
+
+    calendar_server.get_calendar_session()
+
+    assert creds.refreshes == 0
+    lock_free_for = calendar_server._creds_good_until - time.monotonic()
+    assert 0 < lock_free_for <= expires_in.total_seconds() - calendar_server.TOKEN_REFRESH_MARGIN
+
+    # At the very end of the lock-free window google-auth must still consider
+    # the token valid, or AuthorizedSession would refresh it outside the lock.
+    creds.expiry -= timedelta(seconds=lock_free_for)
+    assert creds.valid
+
+def test_batch_gives_up_waiting_on_stalled_request(client, monkeypatch):
+    session = FakeBatchSession()
+    monkeypatch.setattr(calendar_server, 'get_calendar_session', lambda: session)
+    monkeypatch.setattr(calendar_server, 'GOOGLE_API_TIMEOUT', 0.1)
+    stall_in_flight(APPOINTMENT)
+
+    response = post_batch(client, [APPOINTMENT, dict(APPOINTMENT, summary="Follow-up")])
+
+    body = response.get_json()
+    assert body["status"] == "partial"
+    assert body["results"][0] == {"status": "error", "error": calendar_server._IN_FLIGHT_MESSAGE}
+    assert body["results"][1]["status"] == "success"
+
+class TimingOutBatchSession(FakeBatchSession):
+    """
+    Answers the first batch request normally and times out on the rest.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.timeouts = []
+
+    def post(self, url, data, headers, timeout):
+        self.timeouts.append(timeout)
+        if len(self.timeouts) > 1:
+            raise requests.Timeout('read timed out')
+        return super().post(url, data, headers, timeout)
+
+def test_batch_timeout_only_loses_its_own_chunk(client, monkeypatch):
+    session = TimingOutBatchSession()
+    monkeypatch.setattr(calendar_server, 'get_calendar_session', lambda: session)
+    monkeypatch.setattr(calendar_server, 'CALENDAR_BATCH_LIMIT', 2)
+    appointments = [dict(APPOINTMENT, summary=f"Call {index}") for index in range(3)]
+
+    response = post_batch(client, appointments)
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["status"] == "partial"
+    assert [result["status"] for result in body["results"]] == ["success", "success", "error"]
+    assert calendar_server._BATCH_TIMED_OUT.decode() in body["results"][2]["error"]
+    assert len(calendar_server._recent_appointments) == 2
+    assert not calendar_server._in_flight_appointments
+    # Each batch's timeout grows with the number of events in it.
+    per_event = calendar_server.CALENDAR_BATCH_TIMEOUT_PER_EVENT
+    assert session.timeouts == [
+        calendar_server.GOOGLE_API_TIMEOUT + 2 * per_event,
+        calendar_server.GOOGLE_API_TIMEOUT + per_event,
+    ]
+
+@pytest.mark.parametrize('manifest, status', [
+    (b'{"tools": []}', 200),
+    (b'{"tools": [', 500),
+    (None, 404),
+])
+def test_manifest_problems_only_affect_the_manifest_route(client, tmp_path, monkeypatch, manifest, status):
+    if manifest is not None:
+        (tmp_path / 'mcp_server_tools.json').write_bytes(manifest)
+    monkeypatch.chdir(tmp_path)
+    body, loaded_status = calendar_server._load_mcp_tools()
+    monkeypatch.setattr(calendar_server, '_MCP_TOOLS_JSON', body)
+    monkeypatch.setattr(calendar_server, '_MCP_TOOLS_STATUS', loaded_status)
+
+    response = client.get('/mcp_server_tools.json')
+
+    assert response.status_code == status
+    assert response.mimetype == 'application/json'
+    if status == 200:
+        assert response.get_json() == {"tools": []}
+    else:
+        assert "error" in response.get_json()
+
+@pytest.mark.parametrize('summary', [
+    "Intro call",
+    'Call with "Acme" \\ Co.',
+    "Café rendez-vous — 東京",
+    calendar_server._EVENT_PLACEHOLDER,
+    f"Before {calendar_server._EVENT_PLACEHOLDER} after",
+])
+def test_event_body_matches_the_event_dict(summary):
+    start_time, end_time = APPOINTMENT["start_time"], APPOINTMENT["end_time"]
+
+    body = calendar_server._event_body(summary, start_time, end_time)
+
+    # The event body as schedule_appointment originally built it.
+    assert len(calendar_server._EVENT_SEGMENTS) == 4
+    assert orjson.loads(body) == {
+        'summary': summary,
+        'location': 'Client Call',
+        'description': 'Scheduled by AdiuvansAI Agent.',
+        'start': {'dateTime': start_time, 'timeZone': 'America/New_York'},
+        'end': {'dateTime': end_time, 'timeZone': 'America/New_York'},
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'email', 'minutes': 24 * 60},
+                {'method': 'popup', 'minutes': 10},
+            ],
+        },
+    }